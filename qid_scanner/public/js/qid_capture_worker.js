@@ -0,0 +1,139 @@
+// QID Scanner capture worker
+// Crops the card out of a camera frame, converts it to grayscale and encodes it
+// at the server's working resolution, off the UI thread.
+
+const DETECT_WIDTH = 320;       // working width for the card detection pass
+const MIN_CARD_AREA = 0.25;     // card must cover at least this much of the frame
+const CARD_ASPECT_MIN = 1.2;    // ID-1 cards are ~1.586 wide
+const CARD_ASPECT_MAX = 2.2;
+const CROP_MARGIN = 0.03;
+
+self.onmessage = async function(event) {
+    const { id, bitmap, targetWidth, quality } = event.data;
+
+    try {
+        const dataUrl = await prepareImage(bitmap, targetWidth, quality);
+        self.postMessage({ id, dataUrl });
+    } catch (error) {
+        self.postMessage({ id, error: error.message || String(error) });
+    } finally {
+        bitmap.close();
+    }
+};
+
+async function prepareImage(bitmap, targetWidth, quality) {
+    const box = detectCard(bitmap) || { x: 0, y: 0, width: bitmap.width, height: bitmap.height };
+
+    // Never upscale; the server only needs its working resolution
+    const scale = Math.min(1, targetWidth / box.width);
+    const width = Math.round(box.width * scale);
+    const height = Math.round(box.height * scale);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(bitmap, box.x, box.y, box.width, box.height, 0, 0, width, height);
+
+    const image = ctx.getImageData(0, 0, width, height);
+    toGrayscale(image.data);
+    ctx.putImageData(image, 0, 0);
+
+    const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality: quality });
+    return new FileReaderSync().readAsDataURL(blob);
+}
+
+function toGrayscale(pixels) {
+    for (let i = 0; i < pixels.length; i += 4) {
+        const gray = (pixels[i] * 77 + pixels[i + 1] * 150 + pixels[i + 2] * 29) >> 8;
+        pixels[i] = pixels[i + 1] = pixels[i + 2] = gray;
+    }
+}
+
+// Lightweight card detection: Sobel edges on a small copy, then the band of
+// rows and columns with dense edges. Returns a box in full-frame pixels, or
+// null when nothing card-shaped stands out.
+function detectCard(bitmap) {
+    const factor = Math.min(1, DETECT_WIDTH / bitmap.width);
+    const width = Math.round(bitmap.width * factor);
+    const height = Math.round(bitmap.height * factor);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    const pixels = ctx.getImageData(0, 0, width, height).data;
+
+    const gray = new Uint8Array(width * height);
+    for (let i = 0, p = 0; i < gray.length; i++, p += 4) {
+        gray[i] = (pixels[p] * 77 + pixels[p + 1] * 150 + pixels[p + 2] * 29) >> 8;
+    }
+
+    const magnitude = new Float32Array(width * height);
+    let sum = 0;
+    let sumSquares = 0;
+    for (let y = 1; y < height - 1; y++) {
+        for (let x = 1; x < width - 1; x++) {
+            const i = y * width + x;
+            const gx = gray[i - width + 1] + 2 * gray[i + 1] + gray[i + width + 1]
+                - gray[i - width - 1] - 2 * gray[i - 1] - gray[i + width - 1];
+            const gy = gray[i + width - 1] + 2 * gray[i + width] + gray[i + width + 1]
+                - gray[i - width - 1] - 2 * gray[i - width] - gray[i - width + 1];
+            const value = Math.abs(gx) + Math.abs(gy);
+            magnitude[i] = value;
+            sum += value;
+            sumSquares += value * value;
+        }
+    }
+
+    const count = (width - 2) * (height - 2);
+    const mean = sum / count;
+    const threshold = mean + Math.sqrt(Math.max(0, sumSquares / count - mean * mean));
+
+    const rows = new Uint32Array(height);
+    const cols = new Uint32Array(width);
+    for (let y = 1; y < height - 1; y++) {
+        for (let x = 1; x < width - 1; x++) {
+            if (magnitude[y * width + x] > threshold) {
+                rows[y]++;
+                cols[x]++;
+            }
+        }
+    }
+
+    const rowBand = denseBand(rows);
+    const colBand = denseBand(cols);
+    if (!rowBand || !colBand) return null;
+
+    const boxWidth = colBand[1] - colBand[0];
+    const boxHeight = rowBand[1] - rowBand[0];
+    const aspect = boxWidth / boxHeight;
+    if (boxWidth * boxHeight < MIN_CARD_AREA * width * height ||
+        aspect < CARD_ASPECT_MIN || aspect > CARD_ASPECT_MAX) {
+        return null;
+    }
+
+    // Pad slightly so edge text is not clipped, then map back to full size
+    const marginX = boxWidth * CROP_MARGIN;
+    const marginY = boxHeight * CROP_MARGIN;
+    const x0 = Math.max(0, (colBand[0] - marginX) / factor);
+    const y0 = Math.max(0, (rowBand[0] - marginY) / factor);
+    const x1 = Math.min(bitmap.width, (colBand[1] + marginX) / factor);
+    const y1 = Math.min(bitmap.height, (rowBand[1] + marginY) / factor);
+
+    return { x: Math.round(x0), y: Math.round(y0), width: Math.round(x1 - x0), height: Math.round(y1 - y0) };
+}
+
+// First and last index whose edge count reaches a fifth of the peak
+function denseBand(profile) {
+    let peak = 0;
+    for (let i = 0; i < profile.length; i++) {
+        if (profile[i] > peak) peak = profile[i];
+    }
+    if (!peak) return null;
+
+    const cutoff = peak * 0.2;
+    let start = 0;
+    let end = profile.length - 1;
+    while (start < end && profile[start] < cutoff) start++;
+    while (end > start && profile[end] < cutoff) end--;
+
+    return end > start ? [start, end + 1] : null;
+}
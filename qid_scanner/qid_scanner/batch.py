@@ -0,0 +1,170 @@
+import frappe
+import secrets
+from datetime import datetime
+import logging
+
+from qid_scanner.qid_scanner.session_broker import (
+    SESSION_ID_PATTERN, LocalSessionStore, get_session_store
+)
+
+logger = logging.getLogger(__name__)
+
+# Items are staged and results kept individually, so the worker holds one
+# image at a time; the submitting request still receives the whole batch
+BATCH_TTL = 3600
+BATCH_PREFIX = 'qid_scanner:batch:'
+MAX_BATCH_SIZE = 200
+MAX_PAGE_SIZE = 50
+# Background job timeout: a fixed allowance plus a worst-case full ladder per image
+BATCH_BASE_TIMEOUT = 300
+BATCH_ITEM_TIMEOUT = 30
+COMPLETED_EVENT = 'qid_batch_completed'
+
+class QIDBatch:
+    """A batch of QID images processed one at a time by a background job"""
+
+    def __init__(self, batch_id, store=None, ttl=BATCH_TTL):
+        if not batch_id or not SESSION_ID_PATTERN.match(str(batch_id)):
+            raise ValueError("Invalid batch id")
+
+        self.batch_id = batch_id
+        self.store = store or get_session_store()
+        self.ttl = ttl
+
+    def _key(self, *parts):
+        return ':'.join((BATCH_PREFIX + self.batch_id,) + tuple(str(part) for part in parts))
+
+    @classmethod
+    def submit(cls, images, user, store=None):
+        """Stage images item by item and queue the batch; returns the batch"""
+        if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+            raise ValueError("Images must be a list of base64 strings")
+        if not images:
+            raise ValueError("No images submitted")
+        if len(images) > MAX_BATCH_SIZE:
+            raise ValueError(f"Batch too large: {len(images)} images. Maximum: {MAX_BATCH_SIZE}")
+
+        # Workers cannot see the in-memory store, and running the batch inside
+        # this request would outlast the web server timeout
+        store = store or get_session_store()
+        if isinstance(store, LocalSessionStore):
+            raise ValueError("Batch processing is unavailable while Redis is unreachable")
+
+        batch = cls(secrets.token_urlsafe(16), store=store)
+        for index, image_data in enumerate(images):
+            batch.store.set(batch._key('image', index), image_data, batch.ttl)
+
+        batch.store.set(batch._key('meta'), {
+            'user': user,
+            'status': 'queued',
+            'total': len(images),
+            'completed': 0,
+            'created_at': datetime.now().isoformat()
+        }, batch.ttl)
+
+        frappe.enqueue(
+            'qid_scanner.qid_scanner.batch.run_qid_batch',
+            queue='long',
+            timeout=BATCH_BASE_TIMEOUT + BATCH_ITEM_TIMEOUT * len(images),
+            batch_id=batch.batch_id
+        )
+        return batch
+
+    def get_meta(self):
+        return self.store.get(self._key('meta'))
+
+    def run(self, processor):
+        """Process staged images in order, freeing each one as soon as it is done"""
+        meta = self.get_meta()
+        if not meta or meta['status'] != 'queued':
+            return
+
+        meta['status'] = 'running'
+        self.store.set(self._key('meta'), meta, self.ttl)
+
+        for index in range(meta['total']):
+            image_key = self._key('image', index)
+            image_data = self.store.get(image_key)
+            self.store.delete(image_key)
+
+            if image_data is None:
+                result = {
+                    'success': False,
+                    'error': {
+                        'code': 'IMAGE_EXPIRED',
+                        'message': 'Staged image was no longer available',
+                        'details': f'Batch item {index}'
+                    }
+                }
+            else:
+                try:
+                    result = processor.process_qid_image(image_data).to_dict()
+                except Exception as e:
+                    # One bad item must not stop the rest of the batch
+                    logger.error(f"QID batch {self.batch_id} item {index} failed: {e}")
+                    result = {
+                        'success': False,
+                        'error': {
+                            'code': 'PROCESSING_FAILED',
+                            'message': str(e),
+                            'details': f'Batch item {index}'
+                        }
+                    }
+            del image_data
+
+            self.store.set(self._key('result', index), result, self.ttl)
+            del result
+
+            meta['completed'] = index + 1
+            self.store.set(self._key('meta'), meta, self.ttl)
+
+        meta['status'] = 'completed'
+        self.store.set(self._key('meta'), meta, self.ttl)
+
+        frappe.publish_realtime(
+            COMPLETED_EVENT,
+            {'batch_id': self.batch_id, 'total': meta['total']},
+            user=meta['user']
+        )
+
+    def get_results(self, cursor=0, limit=20):
+        """Return finished results from cursor onwards, up to limit items"""
+        meta = self.get_meta()
+        if not meta:
+            return None
+
+        cursor = max(0, int(cursor))
+        # Never move the cursor backwards when asked for items not finished yet
+        end = max(cursor, min(cursor + max(1, min(int(limit), MAX_PAGE_SIZE)), meta['completed']))
+
+        results = []
+        for index in range(cursor, end):
+            results.append({
+                'index': index,
+                'result': self.store.get(self._key('result', index))
+            })
+
+        return {
+            'batch_id': self.batch_id,
+            'status': meta['status'],
+            'total': meta['total'],
+            'completed': meta['completed'],
+            'results': results,
+            # A failed batch will never finish the remaining items
+            'next_cursor': end if end < meta['total'] and meta['status'] != 'failed' else None
+        }
+
+def run_qid_batch(batch_id):
+    """Background job entry point"""
+    from qid_scanner.qid_scanner.page.qid_scanner.qid_scanner import QIDImageProcessor
+
+    batch = QIDBatch(batch_id)
+    try:
+        batch.run(QIDImageProcessor())
+    except Exception as e:
+        logger.error(f"QID batch {batch_id} failed: {e}")
+        meta = batch.get_meta()
+        if meta:
+            meta['status'] = 'failed'
+            batch.store.set(batch._key('meta'), meta, batch.ttl)
+        raise
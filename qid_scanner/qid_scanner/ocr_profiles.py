@@ -0,0 +1,132 @@
+import frappe
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# site_config.json key naming the profile used at runtime
+CONFIG_KEY = 'qid_scanner_ocr_profile'
+SAVED_PROFILES_FILENAME = 'qid_scanner_ocr_profiles.json'
+
+DIGIT_WHITELIST = '-c tessedit_char_whitelist=0123456789'
+LATIN_WHITELIST = '-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz '
+
+THRESHOLD_MODES = ('adaptive', 'otsu', 'none')
+
+class OCRProfile:
+    """Named OCR pipeline settings: Tesseract passes, languages and preprocessing"""
+
+    __slots__ = ('name', 'configs', 'lang', 'threshold', 'max_rungs')
+
+    def __init__(self, name, configs, lang='eng+ara', threshold='adaptive', max_rungs=3):
+        if not configs:
+            raise ValueError(f"OCR profile {name} has no Tesseract configs")
+        if threshold not in THRESHOLD_MODES:
+            raise ValueError(f"Unknown threshold mode: {threshold}")
+        if int(max_rungs) < 1:
+            raise ValueError(f"OCR profile {name} needs at least one resolution rung")
+
+        self.name = name
+        self.configs = dict(configs)
+        self.lang = lang
+        self.threshold = threshold
+        self.max_rungs = int(max_rungs)
+
+    def to_dict(self):
+        return {
+            'configs': self.configs,
+            'lang': self.lang,
+            'threshold': self.threshold,
+            'max_rungs': self.max_rungs
+        }
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(
+            name,
+            data['configs'],
+            lang=data.get('lang', 'eng+ara'),
+            threshold=data.get('threshold', 'adaptive'),
+            max_rungs=int(data.get('max_rungs', 3))
+        )
+
+# The original three-pass pipeline
+DEFAULT_PROFILE = OCRProfile('default', {
+    'default': '--oem 3 --psm 6',
+    'numbers': f'--oem 3 --psm 8 {DIGIT_WHITELIST}',
+    'text': f'--oem 3 --psm 6 {LATIN_WHITELIST}'
+})
+
+BUILTIN_PROFILES = {
+    DEFAULT_PROFILE.name: DEFAULT_PROFILE,
+}
+
+# Parsed saved profiles per site file: path -> (mtime, {name: OCRProfile})
+_saved_profiles_cache = {}
+
+def get_saved_profiles_path():
+    return frappe.get_site_path('private', SAVED_PROFILES_FILENAME)
+
+def _read_saved_profiles(path):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+def load_saved_profiles():
+    """Return profiles saved by the tuning harness for this site, parsed once per file change"""
+    path = get_saved_profiles_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    cached = _saved_profiles_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    profiles = {}
+    for name, data in _read_saved_profiles(path).items():
+        try:
+            profiles[name] = OCRProfile.from_dict(name, data)
+        except (KeyError, TypeError, ValueError) as e:
+            # One bad entry should not take the other saved profiles down with it
+            logger.warning(f"Skipping invalid saved OCR profile {name}: {e}")
+    _saved_profiles_cache[path] = (mtime, profiles)
+    return profiles
+
+def save_ocr_profile(profile, name=None):
+    """Store a profile under a name so it can be selected in site config"""
+    name = name or profile.name
+    if name in BUILTIN_PROFILES:
+        raise ValueError(f"Cannot overwrite built-in OCR profile: {name}")
+
+    path = get_saved_profiles_path()
+    profiles = _read_saved_profiles(path)
+    profiles[name] = profile.to_dict()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(profiles, f, indent=1, sort_keys=True)
+    _saved_profiles_cache.pop(path, None)
+
+    return name
+
+def get_ocr_profile(name=None):
+    """Return the named profile, defaulting to the one set in site config"""
+    name = name or frappe.conf.get(CONFIG_KEY) or DEFAULT_PROFILE.name
+
+    if name in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[name]
+
+    try:
+        saved = load_saved_profiles()
+        if name in saved:
+            return saved[name]
+    except Exception as e:
+        logger.warning(f"Could not load saved OCR profiles: {e}")
+
+    logger.warning(f"OCR profile {name} not found, using default")
+    return DEFAULT_PROFILE
@@ -0,0 +1,182 @@
+"""
+Offline harness for comparing OCR profiles on a labelled image corpus.
+
+The corpus is a directory of card images plus a labels.json mapping each
+file name to its expected fields, for example:
+
+    {"card_001.jpg": {"qid_number": "28463401234", "date_of_birth": "1984-05-12"}}
+
+Run from a bench:
+
+    bench --site your-site execute qid_scanner.qid_scanner.ocr_tuning.tune \\
+        --kwargs "{'corpus_dir': '/path/to/corpus', 'target_accuracy': 0.9, 'save_as': 'tuned'}"
+
+then select the saved profile with `bench --site your-site set-config qid_scanner_ocr_profile tuned`.
+"""
+
+import frappe
+import base64
+import itertools
+import json
+import os
+import time
+import logging
+
+from qid_scanner.qid_scanner.ocr_profiles import (
+    DEFAULT_PROFILE, DIGIT_WHITELIST, LATIN_WHITELIST, OCRProfile, save_ocr_profile
+)
+from qid_scanner.qid_scanner.page.qid_scanner.qid_scanner import QIDImageProcessor
+from qid_scanner.qid_scanner.profiling import ProfilingSettings
+
+logger = logging.getLogger(__name__)
+
+LABELS_FILENAME = 'labels.json'
+FIELDS = ('qid_number', 'date_of_birth', 'expiry_date', 'nationality', 'name_english', 'name_arabic')
+
+# Which Tesseract passes a variant runs
+METHOD_SETS = {
+    'full': ('default', 'numbers', 'text'),
+    'default_numbers': ('default', 'numbers'),
+    'default_only': ('default',),
+}
+
+def build_profile(methods, psm=6, oem=3, lang='eng+ara', threshold='adaptive', max_rungs=3):
+    """Build an OCRProfile from tunable pipeline choices"""
+    configs = {}
+    for method in METHOD_SETS[methods]:
+        if method == 'numbers':
+            configs[method] = f'--oem {oem} --psm 8 {DIGIT_WHITELIST}'
+        elif method == 'text':
+            configs[method] = f'--oem {oem} --psm {psm} {LATIN_WHITELIST}'
+        else:
+            configs[method] = f'--oem {oem} --psm {psm}'
+
+    name = f'{methods}-psm{psm}-oem{oem}-{lang}-{threshold}-r{max_rungs}'
+    return OCRProfile(name, configs, lang=lang, threshold=threshold, max_rungs=max_rungs)
+
+def default_variants():
+    """The grid searched when no variants are given"""
+    variants = [DEFAULT_PROFILE]
+    for methods, psm, lang, threshold, max_rungs in itertools.product(
+        METHOD_SETS, (6, 4), ('eng+ara', 'eng'), ('adaptive', 'otsu'), (1, 3)
+    ):
+        profile = build_profile(methods, psm=psm, lang=lang, threshold=threshold, max_rungs=max_rungs)
+        # One grid point rebuilds the default pipeline, which is already in the list
+        if profile.to_dict() != DEFAULT_PROFILE.to_dict():
+            variants.append(profile)
+    return variants
+
+def load_corpus(corpus_dir):
+    """Return [(file name, base64 image, expected fields)] for the corpus"""
+    with open(os.path.join(corpus_dir, LABELS_FILENAME)) as f:
+        labels = json.load(f)
+
+    corpus = []
+    for filename, expected in sorted(labels.items()):
+        with open(os.path.join(corpus_dir, filename), 'rb') as f:
+            corpus.append((filename, base64.b64encode(f.read()).decode(), expected))
+    return corpus
+
+def _normalize(value):
+    return ' '.join(str(value).split()).casefold() if value else ''
+
+def _extracted_fields(result):
+    data = result.data
+    if data is None:
+        return {}
+
+    return {
+        'qid_number': data.qid_number,
+        'date_of_birth': data.date_of_birth,
+        'expiry_date': data.expiry_date,
+        'nationality': data.nationality,
+        'name_english': data.full_name.get('english'),
+        'name_arabic': data.full_name.get('arabic')
+    }
+
+def _cpu_seconds():
+    # Tesseract runs as a child process, so count waited-for children as well
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def evaluate_profile(profile, corpus):
+    """Run the corpus through one profile and return its accuracy and cost"""
+    processor = QIDImageProcessor(
+        profiling_settings=ProfilingSettings(), ocr_profile=profile, single_flight=False
+    )
+    correct = dict.fromkeys(FIELDS, 0)
+    labelled = dict.fromkeys(FIELDS, 0)
+    cpu_time = 0.0
+    wall_time = 0.0
+
+    for filename, image_data, expected in corpus:
+        cpu_started = _cpu_seconds()
+        wall_started = time.perf_counter()
+        result = processor.process_qid_image(image_data)
+        cpu_time += _cpu_seconds() - cpu_started
+        wall_time += time.perf_counter() - wall_started
+
+        extracted = _extracted_fields(result)
+        for field in FIELDS:
+            if field not in expected:
+                continue
+            labelled[field] += 1
+            if _normalize(extracted.get(field)) == _normalize(expected[field]):
+                correct[field] += 1
+
+    field_accuracy = {
+        field: correct[field] / labelled[field] for field in FIELDS if labelled[field]
+    }
+    scans = len(corpus) or 1
+
+    return {
+        'profile': profile.name,
+        'field_accuracy': field_accuracy,
+        'accuracy': sum(field_accuracy.values()) / len(field_accuracy) if field_accuracy else 0.0,
+        'cpu_per_scan': cpu_time / scans,
+        'wall_per_scan': wall_time / scans
+    }
+
+def format_report(reports):
+    lines = [f"{'profile':<50} {'accuracy':>8} {'cpu/scan':>9} {'wall/scan':>9}  per field"]
+    for report in reports:
+        fields = ' '.join(f"{field}={acc:.2f}" for field, acc in report['field_accuracy'].items())
+        lines.append(
+            f"{report['profile']:<50} {report['accuracy']:>8.3f} "
+            f"{report['cpu_per_scan']:>8.2f}s {report['wall_per_scan']:>8.2f}s  {fields}"
+        )
+    return '\n'.join(lines)
+
+def tune(corpus_dir, target_accuracy=0.9, variants=None, save_as=None):
+    """
+    Evaluate profiles on a labelled corpus and pick the cheapest one that meets the
+    accuracy target. The pick is saved under `save_as` when given.
+    """
+    corpus = load_corpus(corpus_dir)
+    if not corpus:
+        frappe.throw(f"No labelled images found in {corpus_dir}")
+
+    variants = variants or default_variants()
+    profiles = {profile.name: profile for profile in variants}
+
+    reports = []
+    for profile in variants:
+        logger.info(f"Evaluating OCR profile {profile.name} on {len(corpus)} images")
+        reports.append(evaluate_profile(profile, corpus))
+
+    reports.sort(key=lambda report: report['cpu_per_scan'])
+    print(format_report(reports))
+
+    chosen = next((report for report in reports if report['accuracy'] >= float(target_accuracy)), None)
+    if chosen is None:
+        print(f"No profile reached accuracy {target_accuracy}")
+    else:
+        print(f"Cheapest profile meeting {target_accuracy}: {chosen['profile']}")
+        if save_as:
+            save_ocr_profile(profiles[chosen['profile']], save_as)
+            print(f"Saved as OCR profile '{save_as}'")
+
+    return {
+        'reports': reports,
+        'chosen': chosen['profile'] if chosen else None
+    }
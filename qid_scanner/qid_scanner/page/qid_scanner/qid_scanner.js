@@ -1,3 +1,9 @@
+// Uploads are cropped and encoded at the server's OCR working width
+const QID_UPLOAD_WIDTH = 1200;
+const QID_UPLOAD_QUALITY = 0.85;
+const QID_CAPTURE_WORKER_URL = '/assets/qid_scanner/js/qid_capture_worker.js';
+const QID_SESSION_RETRY_SECONDS = 15;
+
 frappe.pages['qid-scanner'].on_page_load = function(wrapper) {
     var page = frappe.ui.make_app_page({
         parent: wrapper,
@@ -15,6 +21,12 @@ class QIDScanner {
         this.wrapper = page.wrapper;
         this.mode = this.detectDeviceMode();
         this.sessionId = this.generateSessionId();
+        this.pairedSessionId = new URLSearchParams(window.location.search).get('session');
+        this.sessionRenewTimer = null;
+        this.sessionExpiries = {};
+        this.captureWorker = null;
+        this.captureRequests = {};
+        this.captureRequestId = 0;
         this.stream = null;
         this.facingMode = 'environment'; // Start with back camera
         
@@ -154,8 +166,81 @@ class QIDScanner {
     initializeDesktopMode() {
         this.elements.modesContainer.show();
         this.elements.cameraInterface.hide();
-        this.generateQRCode();
         this.updateMobileUrl();
+        this.createScanSession();
+    }
+    
+    async createScanSession() {
+        clearTimeout(this.sessionRenewTimer);
+        
+        try {
+            const response = await frappe.call({
+                method: 'qid_scanner.qid_scanner.page.qid_scanner.qid_scanner.create_scan_session'
+            });
+            
+            const session = response.message;
+            this.sessionId = session.session_id;
+            this.trackSession(session);
+            this.listenForSessionResult();
+            this.generateQRCode();
+            
+            // Renew shortly before expiry so the QR code stays scannable
+            this.scheduleSessionRenewal(Math.max(session.expires_in - 15, 15));
+            
+        } catch (error) {
+            console.error('Scan session creation failed:', error);
+            
+            // A QR code without a server session would only be rejected by the phone
+            this.elements.qrCodeContainer.html(`
+                <div class="text-center text-muted">
+                    <i class="fa fa-qrcode fa-4x"></i>
+                    <p class="mt-2">Could not start a scan session. Retrying...</p>
+                </div>
+            `);
+            frappe.show_alert({
+                message: 'Could not start a phone scan session, retrying shortly',
+                indicator: 'red'
+            });
+            this.scheduleSessionRenewal(QID_SESSION_RETRY_SECONDS);
+        }
+    }
+    
+    scheduleSessionRenewal(seconds) {
+        this.sessionRenewTimer = setTimeout(() => {
+            if (this.mode === 'desktop') {
+                this.createScanSession();
+            }
+        }, seconds * 1000);
+    }
+    
+    trackSession(session) {
+        // A phone may still submit to a QR code shown before the last renewal,
+        // so every issued session is accepted until it expires on the server
+        const now = Date.now();
+        Object.keys(this.sessionExpiries).forEach(id => {
+            if (this.sessionExpiries[id] <= now) {
+                delete this.sessionExpiries[id];
+            }
+        });
+        this.sessionExpiries[session.session_id] = now + session.expires_in * 1000;
+    }
+    
+    isOwnSession(sessionId) {
+        const expiresAt = this.sessionExpiries[sessionId];
+        return expiresAt !== undefined && expiresAt > Date.now();
+    }
+    
+    listenForSessionResult() {
+        if (this.onSessionResult) return;
+        
+        // The server pushes the phone's result here, so the desktop never polls
+        this.onSessionResult = (data) => {
+            if (this.isOwnSession(data.session_id)) {
+                clearTimeout(this.sessionRenewTimer);
+                this.showResults(data.result);
+            }
+        };
+        frappe.realtime.on('qid_scan_result', this.onSessionResult);
     }
     
     initializeMobileMode() {
@@ -165,6 +250,7 @@ class QIDScanner {
     }
     
     switchToMobileMode() {
+        clearTimeout(this.sessionRenewTimer);
         this.mode = 'mobile';
         this.initializeMobileMode();
     }
@@ -253,24 +339,14 @@ class QIDScanner {
         }
     }
     
-    captureImage() {
+    async captureImage() {
         try {
             if (!this.elements.cameraVideo || !this.elements.cameraCanvas) {
                 throw new Error('Camera not initialized');
             }
             
-            // Set canvas dimensions to match video
-            const video = this.elements.cameraVideo;
-            const canvas = this.elements.cameraCanvas;
-            canvas.width = video.videoWidth;
-            canvas.height = video.videoHeight;
-            
-            // Draw video frame to canvas
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-            
-            // Convert to base64
-            const imageData = canvas.toDataURL('image/jpeg', 0.9);
+            // Crop, grayscale and downscale before upload
+            const imageData = await this.prepareUpload(this.elements.cameraVideo);
             
             // Process the image
             this.processImage(imageData);
@@ -281,21 +357,98 @@ class QIDScanner {
         }
     }
     
+    async prepareUpload(video) {
+        if (typeof Worker !== 'undefined' && typeof OffscreenCanvas !== 'undefined' &&
+            typeof createImageBitmap !== 'undefined') {
+            try {
+                const bitmap = await createImageBitmap(video);
+                return await this.runCaptureWorker(bitmap);
+            } catch (error) {
+                console.warn('Capture worker failed, encoding on main thread:', error);
+            }
+        }
+        
+        return this.encodeFrame(video);
+    }
+    
+    runCaptureWorker(bitmap) {
+        if (!this.captureWorker) {
+            this.captureWorker = new Worker(QID_CAPTURE_WORKER_URL);
+            this.captureWorker.onmessage = (event) => {
+                const request = this.captureRequests[event.data.id];
+                if (!request) return;
+                
+                delete this.captureRequests[event.data.id];
+                if (event.data.error) {
+                    request.reject(new Error(event.data.error));
+                } else {
+                    request.resolve(event.data.dataUrl);
+                }
+            };
+            this.captureWorker.onerror = (event) => {
+                // Worker script failed; fail pending captures and fall back next time
+                Object.values(this.captureRequests).forEach(request => {
+                    request.reject(new Error(event.message || 'Capture worker error'));
+                });
+                this.captureRequests = {};
+                this.captureWorker.terminate();
+                this.captureWorker = null;
+            };
+        }
+        
+        return new Promise((resolve, reject) => {
+            const id = ++this.captureRequestId;
+            this.captureRequests[id] = { resolve, reject };
+            
+            // Transfer the frame instead of copying it
+            this.captureWorker.postMessage({
+                id: id,
+                bitmap: bitmap,
+                targetWidth: QID_UPLOAD_WIDTH,
+                quality: QID_UPLOAD_QUALITY
+            }, [bitmap]);
+        });
+    }
+    
+    encodeFrame(video) {
+        // Fallback for browsers without worker canvas support: downscale only
+        const canvas = this.elements.cameraCanvas;
+        const scale = Math.min(1, QID_UPLOAD_WIDTH / video.videoWidth);
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
+        
+        // Draw video frame to canvas
+        const ctx = canvas.getContext('2d');
+        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+        
+        // Convert to base64
+        return canvas.toDataURL('image/jpeg', QID_UPLOAD_QUALITY);
+    }
+    
     async processImage(imageData) {
         try {
             this.showProcessing(true);
             
+            const args = {
+                image_data: imageData,
+                metadata: {
+                    session_id: this.pairedSessionId || this.sessionId,
+                    device_type: this.mode,
+                    timestamp: new Date().toISOString()
+                }
+            };
+            
+            // A phone paired from a desktop QR code submits through its session
+            let method = 'qid_scanner.qid_scanner.page.qid_scanner.qid_scanner.process_qid_image';
+            if (this.pairedSessionId) {
+                method = 'qid_scanner.qid_scanner.page.qid_scanner.qid_scanner.submit_session_scan';
+                args.session_id = this.pairedSessionId;
+            }
+            
             // Call ERPNext backend
             const response = await frappe.call({
-                method: 'qid_scanner.qid_scanner.page.qid_scanner.qid_scanner.process_qid_image',
-                args: {
-                    image_data: imageData,
-                    metadata: {
-                        session_id: this.sessionId,
-                        device_type: this.mode,
-                        timestamp: new Date().toISOString()
-                    }
-                }
+                method: method,
+                args: args
             });
             
             this.showProcessing(false);
@@ -504,6 +657,8 @@ class QIDScanner {
             this.elements.cameraInterface.show();
         } else {
             this.elements.modesContainer.show();
+            // The previous session is used up; pair a fresh one
+            this.createScanSession();
         }
     }
     
@@ -660,6 +815,19 @@ class QIDScanner {
         if (this.stream) {
             this.stream.getTracks().forEach(track => track.stop());
         }
+        
+        // Stop the capture worker
+        if (this.captureWorker) {
+            this.captureWorker.terminate();
+            this.captureWorker = null;
+        }
+        
+        // Stop waiting for paired phone results
+        clearTimeout(this.sessionRenewTimer);
+        if (this.onSessionResult) {
+            frappe.realtime.off('qid_scan_result', this.onSessionResult);
+            this.onSessionResult = null;
+        }
     }
 }
 
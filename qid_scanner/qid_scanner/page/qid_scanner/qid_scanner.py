@@ -10,22 +10,38 @@ import hashlib
 from datetime import datetime
 import logging
 
+from qid_scanner.qid_scanner.batch import QIDBatch
+from qid_scanner.qid_scanner.ocr_profiles import DEFAULT_PROFILE, get_ocr_profile
+from qid_scanner.qid_scanner.profiling import ProfilingSettings, ScanProfiler
+from qid_scanner.qid_scanner.session_broker import SessionBroker
+from qid_scanner.qid_scanner.single_flight import SingleFlight, image_key
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Resolution ladder: rescale so glyphs land in Tesseract's preferred
+# 20-30px cap height, then retry larger only when confidence is low
+TARGET_TEXT_HEIGHT = 24
+RESOLUTION_LADDER = (1.0, 1.5, 2.0)
+LOW_CONFIDENCE_THRESHOLD = 0.7
+MIN_OCR_WIDTH = 600
+MAX_OCR_WIDTH = 2400
+DEFAULT_OCR_WIDTH = 1200
+TEXT_ESTIMATE_WIDTH = 640
+MIN_TEXT_COMPONENTS = 15
+
 @frappe.whitelist()
 def process_qid_image(image_data, metadata=None):
     """
     Process QID image and extract information
     """
     try:
-        # Initialize processors
+        # Initialize processor
         processor = QIDImageProcessor()
-        validator = QIDValidator()
         
-        # Process the image
-        result = processor.process_qid_image(image_data, metadata)
+        # Process the image and serialize at the API boundary
+        result = processor.process_qid_image(image_data, metadata).to_dict()
         
         # Return success response
         frappe.response['message'] = result
@@ -51,6 +67,89 @@ def validate_qid_number(qid_number):
         logger.error(f"QID validation failed: {str(e)}")
         frappe.throw(f"QID validation failed: {str(e)}")
 
+@frappe.whitelist()
+def create_scan_session():
+    """
+    Create a pairing session for scanning with a phone camera
+    """
+    try:
+        return SessionBroker().create_session(frappe.session.user)
+        
+    except Exception as e:
+        logger.error(f"Scan session creation failed: {str(e)}")
+        frappe.throw(f"Scan session creation failed: {str(e)}")
+
+@frappe.whitelist()
+def submit_session_scan(session_id, image_data, metadata=None):
+    """
+    Process an image uploaded by a paired phone and push the result to the desktop
+    """
+    broker = SessionBroker()
+    
+    try:
+        session = broker.claim_session(session_id)
+    except ValueError as e:
+        frappe.throw(str(e))
+    
+    if not session:
+        frappe.throw("Scan session has expired or is already in use")
+    
+    try:
+        result = QIDImageProcessor().process_qid_image(image_data, metadata).to_dict()
+    except Exception as e:
+        broker.release_session(session_id, session)
+        logger.error(f"QID processing failed: {str(e)}")
+        frappe.throw(f"QID processing failed: {str(e)}")
+    
+    if result['success']:
+        broker.complete_session(session_id, session, result)
+    else:
+        # Leave the session open so the phone can try again
+        broker.release_session(session_id, session)
+    
+    frappe.response['message'] = result
+    return result
+
+@frappe.whitelist()
+def submit_qid_batch(images):
+    """
+    Queue a list of base64 images for background processing
+    """
+    try:
+        images = frappe.parse_json(images)
+        batch = QIDBatch.submit(images, frappe.session.user)
+        
+        return {'batch_id': batch.batch_id, 'total': len(images)}
+        
+    except Exception as e:
+        logger.error(f"QID batch submission failed: {str(e)}")
+        frappe.throw(f"QID batch submission failed: {str(e)}")
+
+@frappe.whitelist()
+def get_qid_batch_results(batch_id, cursor=0, limit=20):
+    """
+    Fetch one page of finished batch results; pass next_cursor to get the next page
+    """
+    try:
+        batch = QIDBatch(batch_id)
+    except ValueError as e:
+        frappe.throw(str(e))
+    
+    try:
+        cursor = int(cursor)
+        limit = int(limit)
+    except (TypeError, ValueError):
+        frappe.throw("cursor and limit must be integers")
+    
+    meta = batch.get_meta()
+    if not meta:
+        frappe.throw("Batch not found or expired")
+    
+    if meta['user'] != frappe.session.user:
+        frappe.throw("Not permitted to read this batch", frappe.PermissionError)
+    
+    return batch.get_results(cursor, limit)
+
 @frappe.whitelist()
 def get_api_info():
     """
@@ -75,102 +174,319 @@ def get_api_info():
         'timestamp': datetime.now().isoformat()
     }
 
+def _name_confidence(names):
+    """Return (english, arabic) confidence for extracted names"""
+    english = names.get('english')
+    arabic = names.get('arabic')
+    english_score = min(0.95, len(english.split()) * 0.25 + 0.5) if english else 0.0
+    arabic_score = min(0.95, len(arabic) * 0.03 + 0.4) if arabic else 0.0
+    return english_score, arabic_score
+
+class QIDValidation:
+    """Parsed QID number, computed once and shared across pipeline stages"""
+
+    __slots__ = (
+        'valid', 'qid_number', 'error', 'century_digit', 'year_digits',
+        'nationality_code', 'sequence_number', 'birth_year', 'age', 'nationality'
+    )
+
+    def __init__(self, valid, qid_number, error=None, century_digit=None, year_digits=None,
+                 nationality_code=None, sequence_number=None, birth_year=None, age=None,
+                 nationality=None):
+        self.valid = valid
+        self.qid_number = qid_number
+        self.error = error
+        self.century_digit = century_digit
+        self.year_digits = year_digits
+        self.nationality_code = nationality_code
+        self.sequence_number = sequence_number
+        self.birth_year = birth_year
+        self.age = age
+        self.nationality = nationality
+
+    @classmethod
+    def invalid(cls, qid_number, error):
+        return cls(False, qid_number, error=error)
+
+    def parsed_info(self):
+        return {
+            'birth_year': self.birth_year,
+            'age': self.age,
+            'nationality': self.nationality,
+            'nationality_code': self.nationality_code
+        }
+
+    def to_dict(self):
+        if not self.valid:
+            return {
+                'valid': False,
+                'error': self.error,
+                'qid_number': self.qid_number
+            }
+
+        return {
+            'valid': True,
+            'qid_number': self.qid_number,
+            'components': {
+                'century_digit': self.century_digit,
+                'year_digits': self.year_digits,
+                'nationality_code': self.nationality_code,
+                'sequence_number': self.sequence_number
+            },
+            'parsed_info': self.parsed_info()
+        }
+
+class QIDData:
+    """Information extracted from a single QID scan"""
+
+    __slots__ = ('qid_validation', 'full_name', 'date_of_birth', 'expiry_date', 'confidence_scores')
+
+    document_type = 'Qatar ID'
+
+    def __init__(self, qid_validation, full_name, date_of_birth, expiry_date, confidence_scores):
+        self.qid_validation = qid_validation
+        self.full_name = full_name
+        self.date_of_birth = date_of_birth
+        self.expiry_date = expiry_date
+        self.confidence_scores = confidence_scores
+
+    @property
+    def qid_number(self):
+        return self.qid_validation.qid_number
+
+    @property
+    def nationality(self):
+        return self.qid_validation.nationality
+
+    def to_dict(self):
+        return {
+            'qid_number': self.qid_number,
+            'full_name': self.full_name,
+            'date_of_birth': self.date_of_birth,
+            'nationality': self.nationality,
+            'expiry_date': self.expiry_date,
+            'document_type': self.document_type,
+            'confidence_scores': self.confidence_scores,
+            'qid_details': self.qid_validation.parsed_info()
+        }
+
+class ValidationResult:
+    """Outcome of validating extracted QID data"""
+
+    __slots__ = ('errors', 'warnings', 'confidence_scores')
+
+    def __init__(self, errors, warnings, confidence_scores):
+        self.errors = errors
+        self.warnings = warnings
+        self.confidence_scores = confidence_scores
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            'valid': self.valid,
+            'errors': self.errors,
+            'warnings': self.warnings,
+            'confidence_scores': self.confidence_scores
+        }
+
+class ScanResult:
+    """Result of one QID scan, serialized to the response shape on demand"""
+
+    __slots__ = (
+        'success', 'processing_id', 'timestamp', 'data', 'validation', 'processing_time',
+        'resolution_attempts', 'error'
+    )
+
+    def __init__(self, success, processing_id, timestamp=None, data=None, validation=None,
+                 processing_time=None, resolution_attempts=None, error=None):
+        self.success = success
+        self.processing_id = processing_id
+        self.timestamp = timestamp or datetime.now()
+        self.data = data
+        self.validation = validation
+        self.processing_time = processing_time
+        self.resolution_attempts = resolution_attempts
+        self.error = error
+
+    @classmethod
+    def failure(cls, processing_id, code, message, details):
+        return cls(False, processing_id, error={
+            'code': code,
+            'message': message,
+            'details': details
+        })
+
+    def to_dict(self):
+        if self.validation is None:
+            # Processing stopped before validation; keep the short error shape
+            return {
+                'success': False,
+                'error': self.error,
+                'processing_id': self.processing_id,
+                'timestamp': self.timestamp.isoformat()
+            }
+
+        result = {
+            'success': self.success,
+            'data': self.data.to_dict() if self.data is not None else {},
+            'validation': self.validation.to_dict(),
+            'processing_metadata': {
+                'processing_id': self.processing_id,
+                'processing_time': self.processing_time,
+                'resolution_attempts': self.resolution_attempts,
+                'timestamp': self.timestamp.isoformat(),
+                'ocr_engines_used': ['tesseract'],
+                'image_processed': True,
+                'erpnext_integration': True
+            }
+        }
+
+        if self.error:
+            result['error'] = self.error
+
+        return result
+
 class QIDImageProcessor:
     """QID Image Processing Engine for ERPNext"""
     
-    def __init__(self):
-        # OCR configuration
-        self.tesseract_config = {
-            'default': '--oem 3 --psm 6',
-            'numbers': '--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789',
-            'text': '--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz '
-        }
+    def __init__(self, profiling_settings=None, ocr_profile=None, single_flight=True):
+        # OCR configuration, selected by name in site config
+        self.ocr_profile = ocr_profile or get_ocr_profile()
+        self.tesseract_config = self.ocr_profile.configs
+        
+        # Opt-in profiling of slow or sampled scans (site config)
+        self.profiling_settings = profiling_settings or ProfilingSettings.from_conf()
+        
+        # Coalesce concurrent scans of the same image across workers
+        self.single_flight = SingleFlight() if single_flight else None
         
         self.validator = QIDValidator()
         logger.info("QID Image Processor initialized for ERPNext")
     
     def process_qid_image(self, image_data, metadata=None):
         """Process QID image and extract information"""
+        if self.single_flight is None:
+            return self._process_qid_image(image_data, metadata)
+        
+        # Identical images in flight share one OCR run; results depend on the profile
+        key = image_key(image_data, self.ocr_profile.name)
+        # Only share results OCR actually produced; transient failures are retried by each caller
+        return self.single_flight.do(
+            key,
+            lambda: self._process_qid_image(image_data, metadata),
+            shareable=lambda result: result.validation is not None
+        )
+    
+    def _process_qid_image(self, image_data, metadata=None):
+        """Run the OCR pipeline on one image"""
         start_time = datetime.now()
         processing_id = hashlib.md5(f"{image_data[:100]}{start_time}".encode()).hexdigest()[:8]
+        profiler = ScanProfiler(processing_id, self.profiling_settings)
+        image = None
+        result = None
         
         logger.info(f"Starting QID processing [{processing_id}] in ERPNext")
         
         try:
-            # Step 1: Decode and process image
+            # Step 1: Decode image once; every resolution rung reuses this buffer
             logger.info(f"[{processing_id}] Processing image...")
-            processed_image = self._process_image(image_data)
-            
-            # Step 2: Extract text using Tesseract
-            logger.info(f"[{processing_id}] Extracting text...")
-            ocr_results = self._extract_text_multiple_methods(processed_image)
-            
-            # Combine results
-            combined_text = '\n'.join([text for text in ocr_results.values() if text])
-            
-            if not combined_text.strip():
-                return {
-                    'success': False,
-                    'error': {
-                        'code': 'NO_TEXT_EXTRACTED',
-                        'message': 'No text could be extracted from the image',
-                        'details': 'OCR failed to detect any readable text'
-                    },
-                    'processing_id': processing_id,
-                    'timestamp': datetime.now().isoformat()
-                }
+            with profiler.stage('decode'):
+                image = self._decode_image(image_data)
             
-            # Step 3: Extract QID information
-            logger.info(f"[{processing_id}] Extracting QID information...")
-            qid_info = self._extract_qid_information(combined_text, ocr_results)
+            with profiler.stage('estimate'):
+                ladder = self._resolution_ladder(image)
+            
+            qid_data = None
+            best_score = -1.0
+            attempts = 0
+            text_found = False
+            
+            for scale in ladder:
+                attempts += 1
+                with profiler.stage('enhance'):
+                    processed_image = self._enhance_image(self._rescale_image(image, scale))
+                
+                # Step 2: Extract text using Tesseract
+                logger.info(f"[{processing_id}] Extracting text at scale {scale:.2f}...")
+                with profiler.stage('ocr'):
+                    ocr_results = self._extract_text_multiple_methods(processed_image)
+                
+                # Combine results
+                combined_text = '\n'.join([text for text in ocr_results.values() if text])
+                if not combined_text.strip():
+                    continue
+                text_found = True
+                
+                # Step 3: Extract QID information
+                logger.info(f"[{processing_id}] Extracting QID information...")
+                with profiler.stage('extract'):
+                    candidate = self._extract_qid_information(combined_text, ocr_results)
+                score = candidate.confidence_scores['overall'] if candidate else 0.0
+                if candidate and score > best_score:
+                    qid_data, best_score = candidate, score
+                
+                if best_score >= LOW_CONFIDENCE_THRESHOLD:
+                    break
+                logger.info(f"[{processing_id}] Low confidence at scale {scale:.2f}")
+            
+            if not text_found:
+                result = ScanResult.failure(
+                    processing_id,
+                    'NO_TEXT_EXTRACTED',
+                    'No text could be extracted from the image',
+                    'OCR failed to detect any readable text'
+                )
+                return result
             
             # Step 4: Validate extracted data
             logger.info(f"[{processing_id}] Validating extracted data...")
-            validation_results = self.validator.validate_extracted_data(qid_info['data'])
+            with profiler.stage('validate'):
+                validation_results = self.validator.check_extracted_data(qid_data)
             
             # Step 5: Compile results
             processing_time = (datetime.now() - start_time).total_seconds()
             
-            result = {
-                'success': qid_info['success'],
-                'data': qid_info['data'],
-                'validation': validation_results,
-                'processing_metadata': {
-                    'processing_id': processing_id,
-                    'processing_time': processing_time,
-                    'timestamp': datetime.now().isoformat(),
-                    'ocr_engines_used': ['tesseract'],
-                    'image_processed': True,
-                    'erpnext_integration': True
-                }
-            }
+            result = ScanResult(
+                qid_data is not None,
+                processing_id,
+                data=qid_data,
+                validation=validation_results,
+                processing_time=processing_time,
+                resolution_attempts=attempts
+            )
             
-            if not validation_results['valid']:
-                result['success'] = False
-                result['error'] = {
+            if not validation_results.valid:
+                result.success = False
+                result.error = {
                     'code': 'VALIDATION_FAILED',
                     'message': 'Extracted data failed validation',
-                    'details': validation_results['errors']
+                    'details': validation_results.errors
                 }
             
-            logger.info(f"[{processing_id}] Processing completed in {processing_time:.2f}s")
+            logger.info(
+                f"[{processing_id}] Processing completed in {processing_time:.2f}s "
+                f"({profiler.format_timings()})"
+            )
             return result
             
         except Exception as e:
-            logger.error(f"[{processing_id}] Processing failed: {e}")
-            return {
-                'success': False,
-                'error': {
-                    'code': 'PROCESSING_FAILED',
-                    'message': str(e),
-                    'details': 'Unexpected error during processing'
-                },
-                'processing_id': processing_id,
-                'timestamp': datetime.now().isoformat()
-            }
+            logger.error(f"[{processing_id}] Processing failed: {e} ({profiler.format_timings()})")
+            result = ScanResult.failure(
+                processing_id,
+                'PROCESSING_FAILED',
+                str(e),
+                'Unexpected error during processing'
+            )
+            return result
+            
+        finally:
+            profiler.finish(result, image)
     
-    def _process_image(self, image_data):
-        """Process and enhance image for OCR"""
+    def _decode_image(self, image_data):
+        """Decode base64 image data into an OpenCV image"""
         try:
             # Remove data URL prefix if present
             if image_data.startswith('data:image'):
@@ -188,34 +504,82 @@ class QIDImageProcessor:
             if width < 200 or height < 100:
                 raise ValueError(f"Image too small: {width}x{height}. Minimum size: 200x100")
             
-            # Resize if too large
-            max_width = 1200
-            if width > max_width:
-                scale = max_width / width
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                opencv_image = cv2.resize(opencv_image, (new_width, new_height))
-            
-            # Image enhancement pipeline
-            enhanced_image = self._enhance_image(opencv_image)
-            
-            return enhanced_image
+            return opencv_image
             
         except Exception as e:
             raise ValueError(f"Image processing failed: {e}")
     
+    def _estimate_text_height(self, image):
+        """Estimate typical glyph height in pixels from a connected-component pass"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # Work on a small copy; the estimate is scaled back to full size
+        factor = min(1.0, TEXT_ESTIMATE_WIDTH / gray.shape[1])
+        if factor < 1.0:
+            gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        
+        # Keep glyph-shaped components, skipping the background label
+        heights = stats[1:count, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:count, cv2.CC_STAT_WIDTH]
+        glyphs = (heights >= 3) & (heights <= gray.shape[0] * 0.2) & \
+            (widths >= heights * 0.1) & (widths <= heights * 1.5)
+        
+        if np.count_nonzero(glyphs) < MIN_TEXT_COMPONENTS:
+            return None
+        
+        return float(np.median(heights[glyphs])) / factor
+    
+    def _resolution_ladder(self, image):
+        """Return the scale factors to try, smallest first"""
+        width = image.shape[1]
+        text_height = self._estimate_text_height(image)
+        
+        if text_height:
+            base_scale = TARGET_TEXT_HEIGHT / text_height
+        else:
+            # No usable estimate; fall back to the fixed working width
+            base_scale = min(1.0, DEFAULT_OCR_WIDTH / width)
+        
+        scales = []
+        for step in RESOLUTION_LADDER[:self.ocr_profile.max_rungs]:
+            target_width = min(max(width * base_scale * step, MIN_OCR_WIDTH), MAX_OCR_WIDTH)
+            scale = target_width / width
+            # Clamping can collapse rungs onto the same size
+            if not scales or scale > scales[-1] * 1.05:
+                scales.append(scale)
+        
+        return scales
+    
+    def _rescale_image(self, image, scale):
+        """Resize image by scale, leaving near-identity scales untouched"""
+        if abs(scale - 1.0) < 0.05:
+            return image
+        
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+    
     def _enhance_image(self, image):
         """Enhance image quality for better OCR"""
         # Convert to grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
+        if self.ocr_profile.threshold == 'none':
+            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        
         # Apply Gaussian blur to reduce noise
         blurred = cv2.GaussianBlur(gray, (3, 3), 0)
         
-        # Apply adaptive thresholding
-        thresh = cv2.adaptiveThreshold(
-            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-        )
+        if self.ocr_profile.threshold == 'otsu':
+            # Global thresholding
+            _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        else:
+            # Apply adaptive thresholding
+            thresh = cv2.adaptiveThreshold(
+                blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+            )
         
         # Morphological operations to clean up
         kernel = np.ones((2, 2), np.uint8)
@@ -227,30 +591,25 @@ class QIDImageProcessor:
         return enhanced
     
     def _extract_text_multiple_methods(self, image):
-        """Extract text using multiple OCR configurations"""
+        """Extract text using every OCR configuration in the active profile"""
         results = {}
         
-        # Method 1: Default configuration
-        results['tesseract_default'] = self._extract_text_tesseract(image, 'default')
-        
-        # Method 2: Numbers only
-        results['tesseract_numbers'] = self._extract_text_tesseract(image, 'numbers')
-        
-        # Method 3: Text only
-        results['tesseract_text'] = self._extract_text_tesseract(image, 'text')
+        # The original profile runs default, numbers-only and text-only passes
+        for config_type in self.tesseract_config:
+            results[f'tesseract_{config_type}'] = self._extract_text_tesseract(image, config_type)
         
         return results
     
     def _extract_text_tesseract(self, image, config_type='default'):
         """Extract text using Tesseract OCR"""
         try:
-            config = self.tesseract_config.get(config_type, self.tesseract_config['default'])
+            config = self.tesseract_config.get(config_type, DEFAULT_PROFILE.configs['default'])
             
             # Convert to PIL Image
             pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
             
             # Extract text
-            text = pytesseract.image_to_string(pil_image, config=config, lang='eng+ara')
+            text = pytesseract.image_to_string(pil_image, config=config, lang=self.ocr_profile.lang)
             
             return text.strip()
             
@@ -259,28 +618,17 @@ class QIDImageProcessor:
             return ""
     
     def _extract_qid_information(self, combined_text, ocr_results):
-        """Extract QID information from OCR text"""
+        """Extract QID information from OCR text, or None if no valid QID is found"""
         try:
-            # Extract QID numbers
-            qid_numbers = self.validator.extract_qid_numbers(combined_text)
-            
-            if not qid_numbers:
-                return {
-                    'success': False,
-                    'data': {},
-                    'error': 'No valid QID number found'
-                }
+            # Extract QID numbers, already validated by the extractor
+            qid_validations = self.validator.find_qid_numbers(combined_text)
+            
+            if not qid_validations:
+                logger.info("No valid QID number found")
+                return None
             
             # Use the first valid QID
-            qid_number = qid_numbers[0]
-            qid_validation = self.validator.validate_qid_number(qid_number)
-            
-            if not qid_validation['valid']:
-                return {
-                    'success': False,
-                    'data': {},
-                    'error': f"Invalid QID: {qid_validation['error']}"
-                }
+            qid_validation = qid_validations[0]
             
             # Extract other information
             names = self.validator.extract_names(combined_text)
@@ -292,7 +640,7 @@ class QIDImageProcessor:
             
             if dates:
                 sorted_dates = sorted(dates)
-                qid_birth_year = qid_validation['parsed_info']['birth_year']
+                qid_birth_year = qid_validation.birth_year
                 
                 for date_str in sorted_dates:
                     date_year = int(date_str.split('-')[0])
@@ -310,47 +658,21 @@ class QIDImageProcessor:
                 combined_text, qid_validation, names, dates, ocr_results
             )
             
-            return {
-                'success': True,
-                'data': {
-                    'qid_number': qid_number,
-                    'full_name': names,
-                    'date_of_birth': birth_date,
-                    'nationality': qid_validation['parsed_info']['nationality'],
-                    'expiry_date': expiry_date,
-                    'document_type': 'Qatar ID',
-                    'confidence_scores': confidence_scores,
-                    'qid_details': qid_validation['parsed_info']
-                }
-            }
+            return QIDData(qid_validation, names, birth_date, expiry_date, confidence_scores)
             
         except Exception as e:
-            return {
-                'success': False,
-                'data': {},
-                'error': f"Information extraction failed: {e}"
-            }
+            logger.warning(f"Information extraction failed: {e}")
+            return None
     
     def _calculate_confidence_scores(self, text, qid_validation, names, dates, ocr_results):
         """Calculate confidence scores for extracted data"""
         scores = {}
         
         # QID number confidence
-        scores['qid_number'] = 0.98 if qid_validation['valid'] else 0.0
+        scores['qid_number'] = 0.98 if qid_validation.valid else 0.0
         
         # Name confidence
-        if names.get('english'):
-            word_count = len(names['english'].split())
-            scores['name_english'] = min(0.95, word_count * 0.25 + 0.5)
-        else:
-            scores['name_english'] = 0.0
-        
-        if names.get('arabic'):
-            char_count = len(names['arabic'])
-            scores['name_arabic'] = min(0.95, char_count * 0.03 + 0.4)
-        else:
-            scores['name_arabic'] = 0.0
-        
+        scores['name_english'], scores['name_arabic'] = _name_confidence(names)
         scores['name'] = max(scores['name_english'], scores['name_arabic'])
         
         # Date confidence
@@ -358,7 +680,7 @@ class QIDImageProcessor:
         scores['expiry_date'] = 0.9 if len(dates) >= 2 else 0.5 if len(dates) == 1 else 0.0
         
         # Nationality confidence
-        scores['nationality'] = 0.92 if qid_validation['valid'] else 0.0
+        scores['nationality'] = 0.92 if qid_validation.valid else 0.0
         
         # OCR quality
         text_length = len(text.strip())
@@ -387,17 +709,17 @@ class QIDValidator:
     
     def validate_qid_number(self, qid_number):
         """Validate QID number format and extract information"""
+        return self.parse_qid_number(qid_number).to_dict()
+    
+    def parse_qid_number(self, qid_number):
+        """Parse a QID number into a QIDValidation"""
         try:
             # Remove any spaces or special characters
             qid_clean = re.sub(r'[^\d]', '', str(qid_number))
             
             # Check length
             if len(qid_clean) != 11:
-                return {
-                    'valid': False,
-                    'error': f'QID must be 11 digits, got {len(qid_clean)}',
-                    'qid_number': qid_clean
-                }
+                return QIDValidation.invalid(qid_clean, f'QID must be 11 digits, got {len(qid_clean)}')
             
             # Extract components
             century_digit = qid_clean[0]
@@ -407,11 +729,7 @@ class QIDValidator:
             
             # Validate century digit
             if century_digit not in ['2', '3']:
-                return {
-                    'valid': False,
-                    'error': f'Invalid century digit: {century_digit}. Must be 2 or 3',
-                    'qid_number': qid_clean
-                }
+                return QIDValidation.invalid(qid_clean, f'Invalid century digit: {century_digit}. Must be 2 or 3')
             
             # Calculate birth year
             year_int = int(year_digits)
@@ -423,18 +741,10 @@ class QIDValidator:
             # Validate birth year
             current_year = datetime.now().year
             if birth_year > current_year:
-                return {
-                    'valid': False,
-                    'error': f'Invalid birth year: {birth_year}. Cannot be in the future',
-                    'qid_number': qid_clean
-                }
+                return QIDValidation.invalid(qid_clean, f'Invalid birth year: {birth_year}. Cannot be in the future')
             
             if birth_year < 1900:
-                return {
-                    'valid': False,
-                    'error': f'Invalid birth year: {birth_year}. Too old',
-                    'qid_number': qid_clean
-                }
+                return QIDValidation.invalid(qid_clean, f'Invalid birth year: {birth_year}. Too old')
             
             # Get nationality
             nationality = self.nationality_codes.get(nationality_code, f'Unknown ({nationality_code})')
@@ -442,45 +752,38 @@ class QIDValidator:
             # Calculate age
             age = current_year - birth_year
             
-            return {
-                'valid': True,
-                'qid_number': qid_clean,
-                'components': {
-                    'century_digit': century_digit,
-                    'year_digits': year_digits,
-                    'nationality_code': nationality_code,
-                    'sequence_number': sequence_number
-                },
-                'parsed_info': {
-                    'birth_year': birth_year,
-                    'age': age,
-                    'nationality': nationality,
-                    'nationality_code': nationality_code
-                }
-            }
+            return QIDValidation(
+                True,
+                qid_clean,
+                century_digit=century_digit,
+                year_digits=year_digits,
+                nationality_code=nationality_code,
+                sequence_number=sequence_number,
+                birth_year=birth_year,
+                age=age,
+                nationality=nationality
+            )
             
         except Exception as e:
-            return {
-                'valid': False,
-                'error': f'QID validation failed: {e}',
-                'qid_number': qid_number
-            }
+            return QIDValidation.invalid(qid_number, f'QID validation failed: {e}')
     
-    def extract_qid_numbers(self, text):
-        """Extract potential QID numbers from text"""
+    def find_qid_numbers(self, text):
+        """Find valid QID numbers in text, returned as QIDValidation objects"""
         # Pattern for 11-digit numbers starting with 2 or 3
         qid_pattern = r'\b[23]\d{10}\b'
-        matches = re.findall(qid_pattern, text)
         
-        # Validate each match
         valid_qids = []
-        for match in matches:
-            validation = self.validate_qid_number(match)
-            if validation['valid']:
-                valid_qids.append(match)
+        for match in re.findall(qid_pattern, text):
+            validation = self.parse_qid_number(match)
+            if validation.valid:
+                valid_qids.append(validation)
         
         return valid_qids
     
+    def extract_qid_numbers(self, text):
+        """Extract potential QID numbers from text"""
+        return [validation.qid_number for validation in self.find_qid_numbers(text)]
+    
     def extract_names(self, text):
         """Extract names from OCR text"""
         names = {'english': '', 'arabic': ''}
@@ -538,23 +841,41 @@ class QIDValidator:
     
     def validate_extracted_data(self, data):
         """Validate all extracted data"""
+        return self.check_extracted_data(data).to_dict()
+    
+    def check_extracted_data(self, data):
+        """Validate extracted data, given as a QIDData or a plain dict"""
         errors = []
         warnings = []
         confidence_scores = {}
         
+        if isinstance(data, QIDData):
+            # Reuse the parsed QID and name scores from the extraction stage
+            qid_validation = data.qid_validation
+            names = data.full_name
+            name_scores = (data.confidence_scores['name_english'], data.confidence_scores['name_arabic'])
+            date_of_birth = data.date_of_birth
+            expiry_date = data.expiry_date
+        else:
+            data = data or {}
+            qid_validation = self.parse_qid_number(data['qid_number']) if data.get('qid_number') else None
+            names = data.get('full_name', {})
+            name_scores = _name_confidence(names)
+            date_of_birth = data.get('date_of_birth')
+            expiry_date = data.get('expiry_date')
+        
         # Validate QID number
-        if data.get('qid_number'):
-            qid_validation = self.validate_qid_number(data['qid_number'])
-            if not qid_validation['valid']:
-                errors.append(f"Invalid QID number: {qid_validation['error']}")
+        if qid_validation is not None:
+            if not qid_validation.valid:
+                errors.append(f"Invalid QID number: {qid_validation.error}")
                 confidence_scores['qid_number'] = 0.0
             else:
                 confidence_scores['qid_number'] = 0.98
                 
                 # Check birth year consistency
-                if data.get('date_of_birth'):
-                    extracted_year = int(data['date_of_birth'].split('-')[0])
-                    qid_year = qid_validation['parsed_info']['birth_year']
+                if date_of_birth:
+                    extracted_year = int(date_of_birth.split('-')[0])
+                    qid_year = qid_validation.birth_year
                     if abs(extracted_year - qid_year) > 1:
                         warnings.append(f"Birth year mismatch: QID indicates {qid_year}, extracted date indicates {extracted_year}")
                         confidence_scores['date_consistency'] = 0.3
@@ -565,12 +886,11 @@ class QIDValidator:
             confidence_scores['qid_number'] = 0.0
         
         # Validate names
-        names = data.get('full_name', {})
         if names.get('english') or names.get('arabic'):
             if names.get('english'):
-                confidence_scores['name_english'] = min(0.95, len(names['english'].split()) * 0.25 + 0.5)
+                confidence_scores['name_english'] = name_scores[0]
             if names.get('arabic'):
-                confidence_scores['name_arabic'] = min(0.95, len(names['arabic']) * 0.03 + 0.4)
+                confidence_scores['name_arabic'] = name_scores[1]
             confidence_scores['name'] = max(
                 confidence_scores.get('name_english', 0),
                 confidence_scores.get('name_arabic', 0)
@@ -580,10 +900,10 @@ class QIDValidator:
             confidence_scores['name'] = 0.0
         
         # Validate dates
-        if data.get('date_of_birth'):
+        current_year = datetime.now().year
+        if date_of_birth:
             try:
-                birth_year = int(data['date_of_birth'].split('-')[0])
-                current_year = datetime.now().year
+                birth_year = int(date_of_birth.split('-')[0])
                 if birth_year > current_year or birth_year < 1900:
                     errors.append(f"Invalid birth year: {birth_year}")
                     confidence_scores['date_of_birth'] = 0.0
@@ -596,12 +916,11 @@ class QIDValidator:
             warnings.append("No date of birth extracted")
             confidence_scores['date_of_birth'] = 0.0
         
-        if data.get('expiry_date'):
+        if expiry_date:
             try:
-                expiry_year = int(data['expiry_date'].split('-')[0])
-                current_year = datetime.now().year
+                expiry_year = int(expiry_date.split('-')[0])
                 if expiry_year < current_year:
-                    warnings.append(f"QID appears to be expired: {data['expiry_date']}")
+                    warnings.append(f"QID appears to be expired: {expiry_date}")
                 confidence_scores['expiry_date'] = 0.9
             except (ValueError, IndexError):
                 warnings.append("Invalid expiry date format")
@@ -610,10 +929,5 @@ class QIDValidator:
             warnings.append("No expiry date extracted")
             confidence_scores['expiry_date'] = 0.0
         
-        return {
-            'valid': len(errors) == 0,
-            'errors': errors,
-            'warnings': warnings,
-            'confidence_scores': confidence_scores
-        }
+        return ValidationResult(errors, warnings, confidence_scores)
 
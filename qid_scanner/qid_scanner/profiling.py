@@ -0,0 +1,190 @@
+import frappe
+import cv2
+import base64
+import cProfile
+import json
+import os
+import random
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+# site_config.json key, e.g.
+# "qid_scanner_profiling": {"enabled": 1, "slow_threshold": 5, "sample_rate": 0.01}
+CONFIG_KEY = 'qid_scanner_profiling'
+CAPTURE_DIRNAME = 'qid_scanner_profiles'
+
+class ProfilingSettings:
+    """Opt-in profiling settings read from site config"""
+
+    __slots__ = ('enabled', 'slow_threshold', 'sample_rate', 'engine', 'redact', 'max_captures', 'directory')
+
+    def __init__(self, enabled=False, slow_threshold=5.0, sample_rate=0.0, engine='cprofile',
+                 redact=True, max_captures=50, directory=None):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.engine = engine
+        self.redact = redact
+        self.max_captures = max_captures
+        self.directory = directory
+
+    @classmethod
+    def from_conf(cls):
+        conf = frappe.conf.get(CONFIG_KEY) or {}
+        if not conf.get('enabled'):
+            return cls()
+
+        return cls(
+            enabled=True,
+            slow_threshold=float(conf.get('slow_threshold') or 0),
+            sample_rate=float(conf.get('sample_rate') or 0),
+            engine=conf.get('engine', 'cprofile'),
+            redact=bool(conf.get('redact', True)),
+            max_captures=int(conf.get('max_captures', 50)),
+            directory=conf.get('directory') or frappe.get_site_path('private', CAPTURE_DIRNAME)
+        )
+
+class ScanProfiler:
+    """Per-scan stage timer that optionally traces and keeps slow scans"""
+
+    def __init__(self, processing_id, settings=None):
+        self.processing_id = processing_id
+        self.settings = settings or ProfilingSettings()
+        self.stage_timings = {}
+        self.sampled = self.settings.enabled and random.random() < self.settings.sample_rate
+        self._tracer = None
+        self._started = time.perf_counter()
+
+        # A slow scan is only known afterwards, so a threshold traces every scan
+        if self.settings.enabled and (self.sampled or self.settings.slow_threshold > 0):
+            self._start_tracer()
+
+    def _start_tracer(self):
+        try:
+            if self.settings.engine == 'pyinstrument' and PyinstrumentProfiler is not None:
+                self._tracer = PyinstrumentProfiler()
+                self._tracer.start()
+            else:
+                self._tracer = cProfile.Profile()
+                self._tracer.enable()
+        except Exception as e:
+            # Another profiler may already be active in this process
+            logger.warning(f"[{self.processing_id}] Profiler unavailable: {e}")
+            self._tracer = None
+
+    def _stop_tracer(self):
+        if self._tracer is None:
+            return
+        if isinstance(self._tracer, cProfile.Profile):
+            self._tracer.disable()
+        else:
+            self._tracer.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Accumulate wall time spent in a pipeline stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[name] = self.stage_timings.get(name, 0.0) + time.perf_counter() - started
+
+    def format_timings(self):
+        return ', '.join(f"{name}={seconds:.2f}s" for name, seconds in self.stage_timings.items())
+
+    def finish(self, result, image=None):
+        """Stop tracing and keep the capture if the scan was slow or sampled"""
+        total_time = time.perf_counter() - self._started
+        self._stop_tracer()
+
+        if self._tracer is None:
+            return None
+
+        slow = self.settings.slow_threshold > 0 and total_time >= self.settings.slow_threshold
+        if not (slow or self.sampled):
+            return None
+
+        try:
+            return self._write_capture(result, image, total_time, 'slow' if slow else 'sampled')
+        except Exception as e:
+            # Profiling must never fail a scan
+            logger.warning(f"[{self.processing_id}] Could not save profile capture: {e}")
+            return None
+
+    def _write_capture(self, result, image, total_time, reason):
+        directory = self.settings.directory
+        capture_dir = os.path.join(
+            directory, f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{self.processing_id}"
+        )
+        os.makedirs(capture_dir, exist_ok=True)
+
+        if isinstance(self._tracer, cProfile.Profile):
+            self._tracer.dump_stats(os.path.join(capture_dir, 'profile.prof'))
+        else:
+            with open(os.path.join(capture_dir, 'profile.html'), 'w') as f:
+                f.write(self._tracer.output_html())
+
+        record = {
+            'processing_id': self.processing_id,
+            'reason': reason,
+            'total_time': total_time,
+            'stage_timings': self.stage_timings,
+            'image_shape': list(image.shape) if image is not None else None,
+            'success': result.success if result is not None else False,
+            'error_code': (result.error or {}).get('code') if result is not None else None,
+            'redacted': self.settings.redact
+        }
+
+        # Personal data is only kept when redaction is explicitly switched off
+        if not self.settings.redact:
+            if result is not None:
+                record['result'] = result.to_dict()
+            if image is not None:
+                cv2.imwrite(os.path.join(capture_dir, 'image.png'), image)
+
+        with open(os.path.join(capture_dir, 'scan.json'), 'w') as f:
+            json.dump(record, f, indent=1, default=str)
+
+        self._trim_captures(directory)
+        logger.info(f"[{self.processing_id}] Saved {reason} scan profile to {capture_dir}")
+        return capture_dir
+
+    def _trim_captures(self, directory):
+        # Capture names start with a timestamp, so sorted order is oldest first
+        captures = sorted(os.listdir(directory))
+        for name in captures[:max(0, len(captures) - self.settings.max_captures)]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def replay_capture(capture_dir):
+    """
+    Re-run a captured scan image under cProfile and print the hottest calls.
+    Usage: bench --site <site> execute qid_scanner.qid_scanner.profiling.replay_capture --args "['<dir>']"
+    """
+    import pstats
+    from qid_scanner.qid_scanner.page.qid_scanner.qid_scanner import QIDImageProcessor
+
+    image_path = os.path.join(capture_dir, 'image.png')
+    if not os.path.exists(image_path):
+        frappe.throw("Capture has no image; it was saved with redaction on")
+
+    with open(image_path, 'rb') as f:
+        image_data = base64.b64encode(f.read()).decode()
+
+    tracer = cProfile.Profile()
+    tracer.enable()
+    # Disable capture so the processor's own profiler does not clash with this one
+    result = QIDImageProcessor(ProfilingSettings(), single_flight=False).process_qid_image(image_data)
+    tracer.disable()
+
+    pstats.Stats(tracer).sort_stats('cumulative').print_stats(25)
+    return result.to_dict()
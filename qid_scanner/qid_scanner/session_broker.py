@@ -0,0 +1,203 @@
+import frappe
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pairing sessions live only long enough to scan one card
+SESSION_TTL = 300
+SESSION_PREFIX = 'qid_scanner:session:'
+CLAIM_SUFFIX = ':claim'
+RESULT_EVENT = 'qid_scan_result'
+
+# Seconds before Redis is checked again after a failed ping
+REDIS_RETRY_INTERVAL = 30
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+class LocalSessionStore:
+    """In-memory stand-in for Redis when no cache server is reachable"""
+
+    def __init__(self, max_sessions=2000):
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        # Entries have mixed TTLs, so expired ones can sit behind live ones;
+        # drop every expired entry before evicting live entries by age
+        if len(self._entries) <= self.max_sessions:
+            return
+
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            self._purge(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def claim(self, key, ttl, token='1'):
+        """Set key to token only if absent; returns True for the caller that set it"""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._entries[key] = (now + ttl, token)
+            self._entries.move_to_end(key)
+            self._purge(now)
+            return True
+
+    def release(self, key, token):
+        """Delete a claimed key only if it still holds token"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == token:
+                del self._entries[key]
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class RedisSessionStore:
+    """Session store backed by the site's Redis cache"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or frappe.cache()
+
+    def get(self, key):
+        # expires=True skips frappe.local.cache, which would hide updates from other workers
+        return self.cache.get_value(key, expires=True)
+
+    def set(self, key, value, ttl):
+        self.cache.set_value(key, value, expires_in_sec=ttl)
+
+    def delete(self, key):
+        self.cache.delete_value(key)
+
+    def claim(self, key, ttl, token='1'):
+        return bool(self.cache.set(self.cache.make_key(key), token, ex=ttl, nx=True))
+
+    def release(self, key, token):
+        # Compare and delete atomically so an expired claim cannot free a newer owner's
+        self.cache.eval(RELEASE_SCRIPT, 1, self.cache.make_key(key), token)
+
+_local_store = LocalSessionStore()
+_redis_available = None
+_redis_checked_at = 0.0
+
+def get_session_store():
+    """Return the Redis store, or the process-local store if Redis is down"""
+    global _redis_available, _redis_checked_at
+
+    # A failed check is retried after a short interval so a blip is not permanent
+    now = time.monotonic()
+    if _redis_available is None or (not _redis_available and now - _redis_checked_at >= REDIS_RETRY_INTERVAL):
+        _redis_checked_at = now
+        try:
+            frappe.cache().ping()
+            if _redis_available is False:
+                logger.info("Redis reachable again, leaving in-memory session store")
+            _redis_available = True
+        except Exception as e:
+            logger.warning(f"Redis unavailable, using in-memory session store: {e}")
+            _redis_available = False
+
+    return RedisSessionStore() if _redis_available else _local_store
+
+class SessionBroker:
+    """Pairs a desktop scanner page with a phone camera and relays the result"""
+
+    def __init__(self, store=None, ttl=SESSION_TTL):
+        self.store = store or get_session_store()
+        self.ttl = ttl
+
+    def _key(self, session_id):
+        if not session_id or not SESSION_ID_PATTERN.match(str(session_id)):
+            raise ValueError("Invalid scan session id")
+        return f"{SESSION_PREFIX}{session_id}"
+
+    def _remaining_ttl(self, session):
+        # Updates keep the expiry set at creation, which the desktop relies on
+        return max(1, int(session['expires_at'] - time.time()))
+
+    def create_session(self, user):
+        """Create a pending session owned by the desktop user"""
+        session_id = secrets.token_urlsafe(16)
+        self.store.set(self._key(session_id), {
+            'user': user,
+            'status': 'pending',
+            'created_at': datetime.now().isoformat(),
+            'expires_at': time.time() + self.ttl
+        }, self.ttl)
+
+        return {
+            'session_id': session_id,
+            'expires_in': self.ttl
+        }
+
+    def get_session(self, session_id):
+        return self.store.get(self._key(session_id))
+
+    def claim_session(self, session_id):
+        """Claim a pending session for one phone upload; None if unavailable"""
+        key = self._key(session_id)
+        session = self.store.get(key)
+        if not session or session.get('status') != 'pending':
+            return None
+
+        # Only one upload may process a session at a time
+        ttl = self._remaining_ttl(session)
+        if not self.store.claim(key + CLAIM_SUFFIX, ttl):
+            return None
+
+        session['status'] = 'processing'
+        self.store.set(key, session, ttl)
+        return session
+
+    def release_session(self, session_id, session):
+        """Return a claimed session to pending so the phone can retry"""
+        key = self._key(session_id)
+        session['status'] = 'pending'
+        self.store.set(key, session, self._remaining_ttl(session))
+        self.store.delete(key + CLAIM_SUFFIX)
+
+    def complete_session(self, session_id, session, result):
+        """Mark the session done and push the result to the desktop user"""
+        key = self._key(session_id)
+        session['status'] = 'completed'
+        self.store.set(key, session, self._remaining_ttl(session))
+
+        frappe.publish_realtime(
+            RESULT_EVENT,
+            {'session_id': session_id, 'result': result},
+            user=session['user']
+        )
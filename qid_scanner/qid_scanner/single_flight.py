@@ -0,0 +1,78 @@
+import hashlib
+import secrets
+import time
+import logging
+
+from qid_scanner.qid_scanner.session_broker import get_session_store
+
+logger = logging.getLogger(__name__)
+
+# Duplicate uploads (client retries, double submits) wait for the first
+# worker's result instead of running OCR again
+FLIGHT_PREFIX = 'qid_scanner:flight:'
+LOCK_TTL = 120
+RESULT_TTL = 30
+# Long enough for every waiter to see it at the slowest poll interval
+UNSHARED_TTL = 5
+WAIT_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+def image_key(image_data, *scope):
+    """Hash image payload (without any data URL prefix) into a flight key"""
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',', 1)[1]
+    digest = hashlib.sha256(image_data.encode()).hexdigest()
+    return ':'.join(tuple(str(part) for part in scope) + (digest,))
+
+class SingleFlight:
+    """Run one computation per key across workers and share its result"""
+
+    def __init__(self, store=None, lock_ttl=LOCK_TTL, result_ttl=RESULT_TTL, wait_timeout=WAIT_TIMEOUT):
+        self.store = store or get_session_store()
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+
+    def do(self, key, compute, shareable=None):
+        """
+        Return compute()'s result, computing it at most once per key at a time.
+        Results failing shareable(result) go only to the caller that computed them;
+        waiters then compute for themselves in parallel.
+        """
+        lock_key = f"{FLIGHT_PREFIX}{key}:lock"
+        result_key = f"{FLIGHT_PREFIX}{key}:result"
+        unshared_key = f"{FLIGHT_PREFIX}{key}:unshared"
+        deadline = time.monotonic() + self.wait_timeout
+        interval = POLL_INTERVAL
+
+        while True:
+            result = self.store.get(result_key)
+            if result is not None:
+                return result
+
+            # The leader's result could not be shared; taking turns would only add latency
+            if self.store.get(unshared_key):
+                return compute()
+
+            token = secrets.token_hex(16)
+            if self.store.claim(lock_key, self.lock_ttl, token):
+                try:
+                    result = compute()
+                    if shareable is None or shareable(result):
+                        self.store.set(result_key, result, self.result_ttl)
+                    else:
+                        self.store.set(unshared_key, True, UNSHARED_TTL)
+                    return result
+                finally:
+                    # The lock may have expired and been claimed by another worker
+                    self.store.release(lock_key, token)
+
+            if time.monotonic() >= deadline:
+                # The leader is stuck; don't hold this request hostage
+                logger.warning(f"Timed out waiting for in-flight result {key}, processing directly")
+                return compute()
+
+            # Another worker holds the lock; if it gives up without a result, retry the claim
+            time.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)